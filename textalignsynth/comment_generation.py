@@ -1,6 +1,41 @@
 import numpy as np
 
 
+def _init_chord_symb_dict():
+    """
+    This method builds the dictionary which maps chord annotations to chord comments,
+    e.g., 'Bb:min' to 'B. flat minor.'.
+    """
+    chroma_base = ["C", "D", "E", "F", "G", "A", "B"]
+
+    # add sharp and flat
+    chroma_labels = chroma_base + [f"{c}#" for c in chroma_base] + [f"{c}b" for c in chroma_base]
+
+    # extension for major / minor
+    chord_labels = (
+        chroma_labels + [f"{c}:maj" for c in chroma_labels] + [f"{c}:min" for c in chroma_labels]
+    )
+
+    # write everything out
+    chord_symb_dict = {
+        f"{c}": c.replace("#", " sharp").replace("b", " flat") for c in chord_labels
+    }
+    chord_symb_dict = {
+        f"{k}": (
+            v.replace(":maj", " major.").replace(":min", " minor.")
+            if ":maj" in v or ":min" in v
+            else f"{v} major."
+        )
+        for k, v in chord_symb_dict.items()
+    }
+    chord_symb_dict = {f"{k}": f"{v[0]}.{v[1:]}" for k, v in chord_symb_dict.items()}
+
+    return chord_symb_dict
+
+
+_CHORD_SYMB_DICT = _init_chord_symb_dict()
+
+
 def get_measure_comments(measure_annot_list, start=1, step=1):
     """
     This method converts a measure annotation list into a measure comment list.
@@ -13,14 +48,18 @@ def get_measure_comments(measure_annot_list, start=1, step=1):
         start                   number of the first measure to be synthesized
         step                    interval between syntesized measure numbers
     """
-    measure_comment_list = []
+    measure_annot = np.asarray(measure_annot_list, dtype=float).reshape(-1, 2)
+    t_start, i_measure = measure_annot[:, 0], measure_annot[:, 1]
+
+    # check that measure number is integer
+    mask = np.mod(i_measure, 1) == 0
+    t_start, i_measure = t_start[mask], i_measure[mask]
 
-    for i in range(len(measure_annot_list)):
-        t_start, i_measure = measure_annot_list[i]
+    # leave out some measures if necessary
+    mask = (i_measure - start).astype(np.int64) % step == 0
+    t_start, i_measure = t_start[mask], i_measure[mask].astype(np.int64)
 
-        # check that measure number is integer and leave out some measures if necessary
-        if i_measure.is_integer() and (int(i_measure - start) % step == 0):
-            measure_comment_list.append([t_start, f"{int(i_measure)}."])
+    measure_comment_list = [[float(t), f"{i}."] for t, i in zip(t_start, i_measure)]
 
     return measure_comment_list
 
@@ -28,7 +67,7 @@ def get_measure_comments(measure_annot_list, start=1, step=1):
 def get_chord_comments(chord_annot_list, filter_valid=True, remove_repeated=True):
     """
     This method converts a chord annotation list into a chord comment list. Chord annotations
-    are converted into comments by using the stored dictionary 'self.chord_synth_dict'.
+    are converted into comments by using the module-level dictionary '_CHORD_SYMB_DICT'.
     Optionally, invalid chords (for which there is no key in the dictionary) and chord repetitions are removed.
 
     Parameters:
@@ -37,50 +76,21 @@ def get_chord_comments(chord_annot_list, filter_valid=True, remove_repeated=True
         filter_valid            whether to remove invalid chords
         remove_repeated         whether to remove consecutive chord repetitions
     """
-
-    # ----------------------  Initialize chord dict ---------------------- #
-    chroma_base = ["C", "D", "E", "F", "G", "A", "B"]
-
-    # add sharp and flat
-    chroma_labels = chroma_base + [f"{c}#" for c in chroma_base] + [f"{c}b" for c in chroma_base]
-
-    # extension for major / minor
-    chord_labels = (
-        chroma_labels + [f"{c}:maj" for c in chroma_labels] + [f"{c}:min" for c in chroma_labels]
-    )
-
-    # write everything out
-    chord_symb_dict = {
-        f"{c}": c.replace("#", " sharp").replace("b", " flat") for c in chord_labels
-    }
-    chord_symb_dict = {
-        f"{k}": (
-            v.replace(":maj", " major.").replace(":min", " minor.")
-            if ":maj" in v or ":min" in v
-            else f"{v} major."
-        )
-        for k, v in chord_symb_dict.items()
-    }
-    chord_symb_dict = {f"{k}": f"{v[0]}.{v[1:]}" for k, v in chord_symb_dict.items()}
-
     # ----------------------  Convert chord annotation list ---------------------- #
-    # only keep chords for which a key exists in the chord dict
-    if filter_valid:
-        chord_annot_list = [x for x in chord_annot_list if x[1] in chord_symb_dict.keys()]
-
-    # remove repetitions
-    if remove_repeated:
-        chord_annot_np = np.array(chord_annot_list, dtype=object)
+    chord_comment_list = []
+    prev_chord = None
 
-        # Get boolean mask for rows where the string is not equal to the previous row
-        mask = np.append(True, chord_annot_np[1:, 1] != chord_annot_np[:-1, 1])
+    for t, c in chord_annot_list:
+        # only keep chords for which a key exists in the chord dict
+        if filter_valid and c not in _CHORD_SYMB_DICT:
+            continue
 
-        # Use mask to filter out rows
-        chord_annot_list = chord_annot_np[mask].tolist()
+        # remove repetitions
+        if remove_repeated and chord_comment_list and c == prev_chord:
+            continue
 
-    chord_comment_list = [
-        [t, chord_symb_dict[c] if c in chord_symb_dict.keys() else c] for t, c in chord_annot_list
-    ]
+        chord_comment_list.append([t, _CHORD_SYMB_DICT.get(c, c)])
+        prev_chord = c
 
     return chord_comment_list
 
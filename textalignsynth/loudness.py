@@ -1,5 +1,7 @@
 from pyloudnorm.iirfilter import IIRfilter
+from numba import njit, prange
 import numpy as np
+import scipy.signal
 import warnings
 
 "Most code in here is a slightly modified version of the pyloudnorm package https://github.com/csteinmetz1/pyloudnorm"
@@ -9,14 +11,17 @@ class LoudnessMeter(object):
     """A loudness meter to measure the loudness of signals according to BS.1770
     Provides a single function "measure_loudness" for the user, which allows for arbitrarily short signals and returns a loudness value in LUFS
     Note that if the signal is shorter than the standard time window of 400ms no gating can be applied and the momentary loudness is returned for that signal
+    If use_fir is True, the K-weighting is applied via FFT convolution with a truncated FIR approximation of the IIR filter cascade
     """
 
-    def __init__(self, rate):
+    def __init__(self, rate, use_fir=False):
         self.rate = rate
+        self.use_fir = use_fir
         self.block_size = 0.4  # standard 400ms blocksize of BS.1770
         self.filter_class = "K-weighting"
+        self._scratch = np.empty(0)  # reusable buffer for the filtered signal (see copy=False)
 
-    def measure_loudness(self, data, threshold=-70.0):
+    def measure_loudness(self, data, threshold=-70.0, copy=True):
         """Measure the loudness of a signal.
 
         Uses the weighting filters and block size defined by the meter
@@ -34,6 +39,9 @@ class LoudnessMeter(object):
             Input multichannel audio data.
             threshold : float
             absolute loudness threshold; this value will be returned if the actual loudness is below the threshold
+            copy : bool
+            if False, the filtered signal is written to a scratch buffer owned by the meter instead of a newly allocated array;
+            the input data is never modified, but the meter must not be used concurrently in this case
 
         Returns
         -------
@@ -49,14 +57,70 @@ class LoudnessMeter(object):
         numSamples = input_data.shape[0]
 
         if numSamples > (self.block_size * self.rate):
-            return max(self._integrated_loudness(data), threshold)
+            return max(self._integrated_loudness(data, copy=copy), threshold)
         else:
-            mom_loudness, _ = self._momentary_loudness(data)
+            mom_loudness, _ = self._momentary_loudness(data, copy=copy)
             return max(
                 mom_loudness, threshold
             )  # for a signal duration < blocksize we only get a single momentary loudness value
 
-    def _integrated_loudness(self, data):
+    def prefilter(self, data):
+        """Apply the weighting filters of the meter to a signal.
+
+        The filtered signal can be passed to measure_loudness_prefiltered, e.g., to measure the
+        loudness of many segments of a long signal without filtering each segment again.
+
+        Params
+        -------
+            data : ndarray
+            Input multichannel audio data of shape (samples, ch) or (samples,).
+
+        Returns
+        -------
+            data_k : ndarray
+            Filtered audio data of the same shape as the input.
+        """
+        valid_audio(data, self.rate)
+
+        input_data = np.array(
+            data.T if data.ndim == 2 else data[None, :], dtype=np.float64, order="C"
+        )
+        self._apply_filters(input_data)
+
+        return input_data.T if data.ndim == 2 else input_data[0]
+
+    def measure_loudness_prefiltered(self, data_k, n_lo, n_hi, threshold=-70.0):
+        """Measure the loudness of a segment of a signal filtered with prefilter.
+
+        Gating is applied as in measure_loudness. Since the signal was filtered as a whole,
+        the filter state at the start of the segment is taken from the preceding samples.
+
+        Params
+        -------
+            data_k : ndarray
+            Filtered multichannel audio data as returned by prefilter.
+            n_lo : int
+            first sample of the segment
+            n_hi : int
+            end of the segment (exclusive)
+            threshold : float
+            absolute loudness threshold; this value will be returned if the actual loudness is below the threshold
+
+        Returns
+        -------
+            LUFS : float
+            Loudness of the segment, see measure_loudness
+        """
+        segment = data_k[n_lo:n_hi]
+        valid_audio(segment, self.rate)
+
+        if segment.shape[0] > (self.block_size * self.rate):
+            return max(self._integrated_loudness(segment, prefiltered=True), threshold)
+        else:
+            mom_loudness, _ = self._momentary_loudness(segment, prefiltered=True)
+            return max(mom_loudness, threshold)
+
+    def _integrated_loudness(self, data, copy=True, prefiltered=False):
         """Measure the integrated gated loudness of a signal.
 
         Uses the weighting filters and block size defined by the meter
@@ -71,13 +135,17 @@ class LoudnessMeter(object):
         -------
         data : ndarray
             Input multichannel audio data.
+        copy : bool
+            Whether to allocate a new array for the filtered signal instead of reusing the scratch buffer.
+        prefiltered : bool
+            Whether the input data has already been filtered with prefilter.
 
         Returns
         -------
         LUFS : float
             Integrated gated loudness of the input measured in dB LUFS.
         """
-        input_data = data.copy()
+        input_data = data
         valid_audio(input_data, self.rate)
 
         if input_data.ndim == 1:
@@ -85,57 +153,62 @@ class LoudnessMeter(object):
 
         numChannels = input_data.shape[1]
 
-        mom_loudness, z = self._momentary_loudness(input_data)
+        mom_loudness, z = self._momentary_loudness(input_data, copy=copy, prefiltered=prefiltered)
+        mom_loudness = np.asarray(mom_loudness)
 
         Gamma_a = -70.0  # -70 LKFS = absolute loudness threshold
         G = [1.0, 1.0, 1.0, 1.41, 1.41]  # channel gains
+        G_arr = np.asarray(G[:numChannels])
 
-        # find gating block indices above absolute threshold
-        J_g = [j for j, l_j in enumerate(mom_loudness) if l_j >= Gamma_a]
+        # find gating blocks above absolute threshold
+        mask_a = mom_loudness >= Gamma_a
 
         with warnings.catch_warnings():
             warnings.simplefilter("ignore", category=RuntimeWarning)
             # calculate the average of z[i,j] as show in eq. 5
-            z_avg_gated = [np.mean([z[i, j] for j in J_g]) for i in range(numChannels)]
-        # calculate the relative threshold value (see eq. 6)
-        Gamma_r = (
-            -0.691
-            + 10.0 * np.log10(np.sum([G[i] * z_avg_gated[i] for i in range(numChannels)]))
-            - 10.0
-        )
+            z_avg_gated = z[:, mask_a].mean(axis=1)
+            # calculate the relative threshold value (see eq. 6)
+            Gamma_r = -0.691 + 10.0 * np.log10(G_arr @ z_avg_gated) - 10.0
 
-        # find gating block indices above relative and absolute thresholds  (end of eq. 7)
-        J_g = [j for j, l_j in enumerate(mom_loudness) if (l_j > Gamma_r and l_j > Gamma_a)]
+        # find gating blocks above relative and absolute thresholds  (end of eq. 7)
+        mask = (mom_loudness > Gamma_r) & (mom_loudness > Gamma_a)
         with warnings.catch_warnings():
             warnings.simplefilter("ignore", category=RuntimeWarning)
             # calculate the average of z[i,j] as show in eq. 7 with blocks above both thresholds
-            z_avg_gated = np.nan_to_num(
-                np.array([np.mean([z[i, j] for j in J_g]) for i in range(numChannels)])
-            )
+            z_avg_gated = np.nan_to_num(z[:, mask].mean(axis=1))
 
         # calculate final loudness gated loudness (see eq. 7)
         with np.errstate(divide="ignore"):
-            LUFS = -0.691 + 10.0 * np.log10(
-                np.sum([G[i] * z_avg_gated[i] for i in range(numChannels)])
-            )
+            LUFS = -0.691 + 10.0 * np.log10(G_arr @ z_avg_gated)
 
         return LUFS
 
-    def _momentary_loudness(self, data):
-        input_data = data.copy()
-        valid_audio(input_data, self.rate)
+    def _momentary_loudness(self, data, copy=True, prefiltered=False):
+        valid_audio(data, self.rate)
 
-        if input_data.ndim == 1:
-            input_data = np.reshape(input_data, (input_data.shape[0], 1))
+        if data.ndim == 1:
+            data = np.reshape(data, (data.shape[0], 1))
 
-        numChannels = input_data.shape[1]
-        numSamples = input_data.shape[0]
+        # internally, channels are stored as contiguous rows of shape (ch, samples)
+        if prefiltered:
+            input_data = data.T  # no filtering required, so the input is never modified
+        elif copy:
+            input_data = np.array(data.T, dtype=np.float64, order="C")
+        else:
+            # reuse the scratch buffer, growing it if the input is larger than any seen before
+            if self._scratch.size < data.size:
+                self._scratch = np.empty(data.size)
+            input_data = self._scratch[: data.size].reshape(data.shape[::-1])
+            np.copyto(input_data, data.T)
+
+        numChannels = input_data.shape[0]
+        numSamples = input_data.shape[1]
         # Apply frequency weighting filters - account for the acoustic response of the head and auditory system
-        for filter_class, filter_stage in self._filters.items():
-            for ch in range(numChannels):
-                input_data[:, ch] = filter_stage.apply_filter(input_data[:, ch])
+        if not prefiltered:
+            self._apply_filters(input_data)
 
         G = [1.0, 1.0, 1.0, 1.41, 1.41]  # channel gains
+        G_arr = np.asarray(G[:numChannels], dtype=np.float64)
         T_g = self.block_size  # 400 ms gating block standard
         if numSamples > (self.block_size * self.rate):
             overlap = 0.75  # overlap of 75% of the block duration
@@ -145,41 +218,43 @@ class LoudnessMeter(object):
             numBlocks = int(
                 np.round(((T - T_g) / (T_g * step))) + 1
             )  # total number of gated blocks (see end of eq. 3)
-            j_range = np.arange(0, numBlocks)  # indexed list of total blocks
-            z = np.zeros(shape=(numChannels, numBlocks))  # instantiate array - trasponse of input
-
-            for i in range(numChannels):  # iterate over input channels
-                for j in j_range:  # iterate over total frames
-                    lower = int(
-                        T_g * (j * step) * self.rate
-                    )  # lower bound of integration (in samples)
-                    upper = int(
-                        T_g * (j * step + 1) * self.rate
-                    )  # upper bound of integration (in samples)
-                    # caluate mean square of the filtered for each block (see eq. 1)
-                    z[i, j] = (1.0 / (T_g * self.rate)) * np.sum(
-                        np.square(input_data[lower:upper, i])
-                    )
-
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore", category=RuntimeWarning)
-                # loudness for each jth block (see eq. 4)
-                lower = [
-                    -0.691 + 10.0 * np.log10(np.sum([G[i] * z[i, j] for i in range(numChannels)]))
-                    for j in j_range
-                ]
+            block_len = int(T_g * self.rate)  # block length (in samples)
+            hop = int(T_g * step * self.rate)  # hop size between blocks (in samples)
+
+            # zero-pad the input such that the last (possibly incomplete) block has full length
+            numSamples_required = (numBlocks - 1) * hop + block_len
+            if numSamples_required > numSamples:
+                input_data = np.pad(input_data, ((0, 0), (0, numSamples_required - numSamples)))
+
+            # view of all gating blocks with shape (numChannels, numBlocks, block_len)
+            windows = np.lib.stride_tricks.sliding_window_view(input_data, block_len, axis=1)[
+                :, ::hop
+            ][:, :numBlocks]
+            # caluate mean square of the filtered signal for each block (see eq. 1)
+            z = np.einsum("cbn,cbn->cb", windows, windows) / (T_g * self.rate)
+
+            # loudness for each jth block (see eq. 4)
+            with np.errstate(divide="ignore"):
+                lower = -0.691 + 10.0 * np.log10(G_arr @ z)
         else:
             # only a single block
-            z = np.zeros(shape=(numChannels))
-            for i in range(numChannels):  # iterate over input channels
-                z[i] = (1.0 / (T_g * self.rate)) * np.sum(np.square(input_data[:, i]))
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore", category=RuntimeWarning)
-                # single momentary loudness value
-                lower = -0.691 + 10.0 * np.log10(np.sum(G * z))
+            z = np.einsum("cn,cn->c", input_data, input_data) / (T_g * self.rate)
+
+            # single momentary loudness value
+            with np.errstate(divide="ignore"):
+                lower = -0.691 + 10.0 * np.log10(G_arr @ z)
 
         return lower, z
 
+    def _apply_filters(self, input_data):
+        """Apply the weighting filters in place to input data of shape (ch, samples)."""
+        if self.use_fir:
+            input_data[:] = scipy.signal.oaconvolve(
+                input_data, self._k_weighting_fir[None, :], mode="full", axes=1
+            )[:, : input_data.shape[1]]
+        else:
+            k_weight(input_data, *self._k_weighting_coeffs)
+
     @property
     def filter_class(self):
         return self._filter_class
@@ -193,6 +268,65 @@ class LoudnessMeter(object):
         )
         self._filters["high_pass"] = IIRfilter(0.0, 0.5, 38.0, self.rate, "high_pass")
 
+        # precompute biquad coefficients (b1, a1, b2, a2) of both stages for k_weight
+        self._k_weighting_coeffs = tuple(
+            np.asarray(coeffs, dtype=np.float64)
+            for filter_stage in self._filters.values()
+            for coeffs in (filter_stage.passband_gain * filter_stage.b, filter_stage.a)
+        )
+
+        # FIR approximation of the filter cascade: impulse response truncated after 50 ms,
+        # by then the remaining tail is below -80 dB
+        sos = np.array(
+            [
+                np.concatenate([filter_stage.passband_gain * filter_stage.b, filter_stage.a])
+                for filter_stage in self._filters.values()
+            ]
+        )
+        self._k_weighting_fir = scipy.signal.sosfilt(sos, np.eye(1, int(0.05 * self.rate))[0])
+
+
+@njit(
+    "void(f8[:, ::1], f8[::1], f8[::1], f8[::1], f8[::1])",
+    parallel=True,
+    cache=True,
+    fastmath=True,
+)
+def k_weight(x, b1, a1, b2, a2):
+    """Apply the K-weighting filter cascade (high shelf followed by high pass) in place.
+
+    Both biquad stages are computed in a single pass over the samples using the
+    transposed direct form II, which is equivalent to two consecutive calls of
+    scipy.signal.lfilter with zero initial conditions. Channels are filtered in parallel.
+
+    Params
+    -------
+    x : ndarray
+        Input audio data of shape (ch, samples), overwritten with the filtered signal
+    b1, a1 : ndarray
+        Normalized numerator and denominator coefficients of the first stage
+    b2, a2 : ndarray
+        Normalized numerator and denominator coefficients of the second stage
+    """
+    numChannels, numSamples = x.shape
+
+    for ch in prange(numChannels):
+        # delay elements of both stages
+        s1_1, s1_2, s2_1, s2_2 = 0.0, 0.0, 0.0, 0.0
+
+        for n in range(numSamples):
+            x_n = x[ch, n]
+
+            y_1 = b1[0] * x_n + s1_1
+            s1_1 = b1[1] * x_n - a1[1] * y_1 + s1_2
+            s1_2 = b1[2] * x_n - a1[2] * y_1
+
+            y_2 = b2[0] * y_1 + s2_1
+            s2_1 = b2[1] * y_1 - a2[1] * y_2 + s2_2
+            s2_2 = b2[2] * y_1 - a2[2] * y_2
+
+            x[ch, n] = y_2
+
 
 def valid_audio(data, rate):
     """Validate input audio data.
@@ -1,10 +1,10 @@
 from typing import List, Tuple
-from tqdm import tqdm
 
+import warnings
 import numpy as np
 import librosa
 import libtsm
-import pyloudnorm as pyln
+from numba import njit
 from .loudness import LoudnessMeter
 from .synthesis import TTSWrapper
 
@@ -61,87 +61,98 @@ class Commenter:
             return_comment_track        whether to return the comment track in addition to the commented audio signal
         """
         # resample audio signal to sampling rate of TTS model
-        x_resampled = librosa.resample(x_orig, orig_sr=x_fs, target_sr=self.synthesizer.fs)
-
-        # determine global loudness
-        x_loudness_global = self.loudness_meter.measure_loudness(x_resampled)
-
-        # initialize comment track
-        comment_track = np.zeros_like(x_resampled)
-        padding_left = 0
+        resample = x_fs != self.synthesizer.fs
+        if resample:
+            x_resampled = librosa.resample(x_orig, orig_sr=x_fs, target_sr=self.synthesizer.fs)
+        else:
+            x_resampled = x_orig
 
-        iterable = tqdm(comments) if show_progress_bar else comments
+        # synthesize texts
+        comment_wavs = self.synthesizer.tts_batch(
+            [comment for _, comment in comments], show_progress_bar=show_progress_bar
+        )
 
-        # synthesize and post-process comments individually
-        for t_m, comment in iterable:
-            # synthesize text
-            c_m = self.synthesizer(comment)
+        # post-process comments individually
+        comment_starts = []
+        for i, (t_m, _) in enumerate(comments):
+            c_m = comment_wavs[i]
 
             # remove leading and trailing silence in comment
-            c_m = librosa.effects.trim(np.array(c_m))[0]
+            c_m = _trim(np.asarray(c_m))
 
             c_m = self._modify_comment_duration(c_m, speed, t_min, t_max)
-            n_m = self._get_comment_start(c_m, t_m, pos_rel, pos_offset_abs) + padding_left
+            n_m = self._get_comment_start(c_m, t_m, pos_rel, pos_offset_abs)
+
+            comment_wavs[i] = c_m
+            comment_starts.append(n_m)
+
+        # pad once to handle negative comment starts and comments exceeding signal duration
+        if len(comment_wavs) > 0:
+            padding_left = max(0, -min(comment_starts))
+            padding_right = max(
+                0,
+                max(n_m + len(c_m) for n_m, c_m in zip(comment_starts, comment_wavs))
+                - len(x_resampled)
+                + 1,
+            )
+            x_resampled = np.pad(
+                x_resampled,
+                pad_width=(padding_left, padding_right),
+                mode="constant",
+                constant_values=0.0,
+            )
+        else:
+            padding_left = 0
+            padding_right = 0
 
-            n_m_end = n_m + len(c_m)
+        # apply loudness weighting filters once for all loudness measurements of the signal
+        x_k = self.loudness_meter.prefilter(x_resampled)
 
-            # handle negative n_m
-            if n_m < 0:
-                padding_left_add = np.abs(n_m) - padding_left
-                comment_track = np.pad(
-                    comment_track,
-                    pad_width=(padding_left_add, 0),
-                    mode="constant",
-                    constant_values=0.0,
-                )
-                x_resampled = np.pad(
-                    x_resampled,
-                    pad_width=(padding_left_add, 0),
-                    mode="constant",
-                    constant_values=0.0,
-                )
-                n_m += padding_left_add
-                n_m_end += padding_left_add
-                padding_left += padding_left_add
-
-            # handle comments exceeding signal duration
-            if n_m_end >= len(comment_track):
-                padding_right_add = n_m_end - (len(comment_track) - 1)
-                comment_track = np.pad(
-                    comment_track,
-                    pad_width=(0, padding_right_add),
-                    mode="constant",
-                    constant_values=0.0,
-                )
-                x_resampled = np.pad(
-                    x_resampled,
-                    pad_width=(0, padding_right_add),
-                    mode="constant",
-                    constant_values=0.0,
-                )
+        # determine global loudness
+        x_loudness_global = self.loudness_meter.measure_loudness_prefiltered(
+            x_k, padding_left, len(x_k) - padding_right
+        )
+
+        # initialize comment track (accumulated in double precision, see _mix_inplace)
+        comment_track = np.zeros(len(x_resampled), dtype=np.float64)
+
+        # mix comments into comment track
+        for c_m, n_m in zip(comment_wavs, comment_starts):
+            n_m += padding_left
+            n_m_end = n_m + len(c_m)
 
             # modify loudness
-            x_loudness_local = self.loudness_meter.measure_loudness(x_resampled[n_m:n_m_end])
-            c_m_loudness = self.loudness_meter.measure_loudness(c_m)
+            x_loudness_local = self.loudness_meter.measure_loudness_prefiltered(x_k, n_m, n_m_end)
+            c_m_loudness = self.loudness_meter.measure_loudness(c_m, copy=False)
             c_m_loudness_target = w_glob_loc * (x_loudness_local + offset_loc) + (
                 1 - w_glob_loc
             ) * (x_loudness_global + offset_glob)
-            c_m_normalized = pyln.normalize.loudness(c_m, c_m_loudness, c_m_loudness_target)
+            gain = 10.0 ** ((c_m_loudness_target - c_m_loudness) / 20.0)
+            if gain * np.max(np.abs(c_m)) >= 1.0:
+                warnings.warn("Possible clipped samples in output.")
 
-            comment_track[n_m:n_m_end] += c_m_normalized
+            _mix_inplace(comment_track, np.ascontiguousarray(c_m, dtype=np.float64), n_m, gain)
+
+        comment_track = comment_track.astype(x_resampled.dtype, copy=False)
 
         # superposition
         x_commented = x_resampled + comment_track
 
         # resampling to original sampling rate
-        x_commented = librosa.resample(x_commented, orig_sr=self.synthesizer.fs, target_sr=x_fs)
-
         if return_comment_track:
-            comment_track = librosa.resample(
-                comment_track, orig_sr=self.synthesizer.fs, target_sr=x_fs
-            )
+            if resample:
+                x_commented, comment_track = librosa.resample(
+                    np.stack([x_commented, comment_track], axis=0),
+                    orig_sr=self.synthesizer.fs,
+                    target_sr=x_fs,
+                    axis=-1,
+                )
             return x_commented, comment_track
         else:
+            if resample:
+                x_commented = librosa.resample(
+                    x_commented, orig_sr=self.synthesizer.fs, target_sr=x_fs
+                )
             return x_commented
 
     def _modify_comment_duration(self, comment_wav, speed, t_min, t_max):
@@ -149,13 +160,19 @@ class Commenter:
             t_min is None or t_max is None or t_min <= t_max
         ), "t_min needs to be less or equal to t_max"
 
+        # no time-scale modification required
+        if speed == 1.0 and t_min is None and t_max is None:
+            return comment_wav
+
         alpha = 1 / speed
-        t_comment = alpha * len(comment_wav) / self.synthesizer.fs
 
-        if (t_min is not None) and (t_comment < t_min):
-            alpha *= t_min / t_comment
-        elif (t_max is not None) and (t_comment > t_max):
-            alpha *= t_max / t_comment
+        if (t_min is not None) or (t_max is not None):
+            t_comment = alpha * len(comment_wav) / self.synthesizer.fs
+
+            if (t_min is not None) and (t_comment < t_min):
+                alpha *= t_min / t_comment
+            elif (t_max is not None) and (t_comment > t_max):
+                alpha *= t_max / t_comment
 
         if alpha != 1.0:
             comment_wav = np.squeeze(
@@ -167,3 +184,22 @@ class Commenter:
     def _get_comment_start(self, comment_wav, t_start, pos_rel, pos_offset_abs):
         n_start = (t_start + pos_offset_abs) * self.synthesizer.fs - pos_rel * len(comment_wav)
         return round(n_start)
+
+
+def _trim(comment_wav, top_db=60.0):
+    """
+    Removes leading and trailing samples whose magnitude is more than top_db below the peak.
+    """
+    comment_abs = np.abs(comment_wav)
+    thr = 10 ** (-top_db / 20) * np.max(comment_abs, initial=0.0)
+    idx = np.flatnonzero(comment_abs > thr)
+    return comment_wav[idx[0] : idx[-1] + 1] if idx.size else comment_wav[:0]
+
+
+@njit("void(f8[::1], f8[::1], i8, f8)", cache=True, fastmath=True)
+def _mix_inplace(track, clip, n_start, gain):
+    """
+    Adds the clip scaled by the given gain to the track in place, starting at sample n_start.
+    """
+    for k in range(len(clip)):
+        track[n_start + k] += clip[k] * gain
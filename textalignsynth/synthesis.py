@@ -1,6 +1,8 @@
-from contextlib import nullcontext
+from contextlib import contextmanager, nullcontext
+from tqdm import tqdm
 
 import numpy as np
+import torch
 
 from .utils import suppress_stdout
 
@@ -8,6 +10,7 @@ from .utils import suppress_stdout
 class TTSWrapper:
     def __init__(self, device="cpu", language="en", verbose=False):
         self.verbose = verbose
+        self.device = device
 
         with suppress_stdout() if not self.verbose else nullcontext():
             from TTS.api import TTS
@@ -25,5 +28,31 @@ class TTSWrapper:
                 self.fs = 22050
 
     def __call__(self, text):
-        with suppress_stdout() if not self.verbose else nullcontext():
-            return np.array(self.synthesizer.tts(text=text))
+        with self._inference_context():
+            return np.asarray(self.synthesizer.tts(text=text), dtype=np.float32)
+
+    def tts_batch(self, texts, show_progress_bar=False):
+        """
+        Synthesizes a list of texts within a single inference context.
+
+        Parameters:
+            texts                   list of texts to be synthesized
+            show_progress_bar       whether to show a progress bar
+        """
+        iterable = tqdm(texts) if show_progress_bar else texts
+
+        with self._inference_context():
+            return [
+                np.asarray(self.synthesizer.tts(text=text), dtype=np.float32) for text in iterable
+            ]
+
+    @contextmanager
+    def _inference_context(self):
+        # no autograd bookkeeping during synthesis, and half precision on GPU
+        with suppress_stdout() if not self.verbose else nullcontext(), torch.inference_mode():
+            with (
+                torch.autocast("cuda", dtype=torch.float16)
+                if "cuda" in str(self.device)
+                else nullcontext()
+            ):
+                yield